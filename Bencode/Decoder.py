@@ -1,15 +1,311 @@
-from collections import OrderedDict
+import re
+
+# Bencode delimiters are ASCII regardless of the encoding of string payloads.
+_CHAR_I = ord('i')
+_CHAR_L = ord('l')
+_CHAR_D = ord('d')
+_CHAR_E = ord('e')
+_CHAR_0 = ord('0')
+_CHAR_9 = ord('9')
+_CHAR_COLON = ord(':')
+_CHAR_HYPHEN = ord('-')
+
+# Well-formed integer (after 'i') and string length prefix, used to skip elements without building them.
+_INT_RE = re.compile(rb'(?:0|-?[1-9][0-9]*)e')
+_STRING_LENGTH_RE = re.compile(rb'(0*[1-9][0-9]*):')
 
 
 class DecodeError(Exception):
     def __init__(self, message):
+        """
+        :param message: Error message, or a callable returning it. A callable is only called when the message is
+        read, so messages quoting (possibly large) input cost nothing when the error is caught and discarded.
+        """
         super().__init__()
-        self.message = message
+        self._message = message
+
+    @property
+    def message(self):
+        if callable(self._message):
+            self._message = self._message()
+        return self._message
+
+    @message.setter
+    def message(self, message):
+        self._message = message
 
     def __str__(self):
         return self.message
 
 
+# Native parser from _decoder.c, or None when the extension is not built.
+try:
+    from . import _decoder as _native
+except ImportError:
+    _native = None
+else:
+    _native.set_error(DecodeError)
+
+
+def _as_buffer(inp: bytes or memoryview):
+    """
+    Prepare bytes-like input (bytearray, memoryview) for the parser. The native parser reads any buffer in place, so
+    it only gets a byte-wise view; the pure-Python fallback needs bytes, so the input is copied once for it.
+    :param inp: Input bytes string or bytes-like object
+    :return: Input as bytes, or as a memoryview of unsigned bytes when the native parser is available
+    """
+    if type(inp) is bytes:
+        return inp
+    if _native is not None:
+        return memoryview(inp).cast('B')
+    return bytes(inp)
+
+
+def _parse(buf: bytes, idx: int):
+    """
+    Decode the element starting at index idx. Every bencoded element is self-delimiting, so the input is consumed
+    in a single pass without searching for the matching 'e' of containers. This is the pure-Python fallback of
+    the native parser in _decoder.c; both must accept and reject the same input.
+    :param buf: Input bytes string
+    :param idx: Index of the first byte of the element
+    :return: Tuple of decoded element and index right after it
+    """
+    if idx >= len(buf):
+        raise DecodeError(f'Unexpected end of input at index {idx}.')
+
+    return _DISPATCH[buf[idx]](buf, idx)
+
+
+def _parse_invalid(buf: bytes, idx: int):
+    raise DecodeError(f'Cannot infer type from character \'{chr(buf[idx])}\' at index {idx}.')
+
+
+def _parse_int(buf: bytes, idx: int):
+    ending_e = buf.find(_CHAR_E, idx + 1)
+    if ending_e == -1:
+        raise DecodeError(f'Integer at index {idx} must end with \'e\'.')
+
+    # Validate with byte comparisons first, so int() only ever sees plain ASCII digits
+    # (it would otherwise accept whitespace, '+' and '_').
+    start = idx + 1
+    negative = start < ending_e and buf[start] == _CHAR_HYPHEN
+    if negative:
+        start += 1
+
+    digits = buf[start: ending_e]
+    if not digits.isdigit():
+        raise DecodeError(lambda: f'Integer must be encoded in base ten ASCII. '
+                                  f'Input: {buf[idx: ending_e + 1]}.')
+
+    if digits[0] == _CHAR_0:
+        if len(digits) > 1:
+            raise DecodeError(lambda: f'Leading zeros are not allowed. Input: {buf[idx: ending_e + 1]}.')
+        if negative:
+            raise DecodeError(lambda: f'Negative zero is not permitted. Input: {buf[idx: ending_e + 1]}.')
+
+    result = int(digits)
+    return -result if negative else result, ending_e + 1
+
+
+def _parse_string(buf: bytes, idx: int):
+    colon = buf.find(_CHAR_COLON, idx + 1)
+    if colon == -1:
+        raise DecodeError(f'String at index {idx} must contain colon \':\'.')
+
+    prefix = buf[idx: colon]
+    str_len = int(prefix) if prefix.isdigit() else 0
+    if str_len <= 0:
+        raise DecodeError(lambda: f'Prefixed string before colon must be an integer and higher than 0. '
+                                  f'Input: {buf[idx: colon + 1]}.')
+
+    end = colon + 1 + str_len
+    if end > len(buf):
+        raise DecodeError(f'String length and predefined length do not match. '
+                          f'String length: {len(buf) - colon - 1}, predefined length: {str_len}.')
+
+    return buf[colon + 1: end], end
+
+
+def _parse_list(buf: bytes, idx: int):
+    results = list()
+    append = results.append
+    dispatch = _DISPATCH
+    end = len(buf)
+    idx += 1
+
+    while idx < end:
+        char = buf[idx]
+        if char == _CHAR_E:
+            return results, idx + 1
+        result, idx = dispatch[char](buf, idx)
+        append(result)
+
+    raise DecodeError('List must end with \'e\'.')
+
+
+def _parse_dictionary(buf: bytes, idx: int):
+    results = {}
+    prev_key = None
+    dispatch = _DISPATCH
+    end = len(buf)
+    idx += 1
+
+    while idx < end:
+        char = buf[idx]
+        if char == _CHAR_E:
+            return results, idx + 1
+
+        # Extract key (string)
+        if not _CHAR_0 <= char <= _CHAR_9:
+            raise DecodeError(f'Dictionary key must conform to string specification. '
+                              f'Found \'{chr(char)}\' at index {idx}.')
+        key, idx = _parse_string(buf, idx)
+        if prev_key is not None and key <= prev_key:
+            raise DecodeError('Keys must be strings and appear in sorted order '
+                              '(sorted as raw strings, not alphanumerics).')
+        prev_key = key
+
+        # Extract value
+        if idx >= end:
+            raise DecodeError(f'Unexpected end of input at index {idx}.')
+        value, idx = dispatch[buf[idx]](buf, idx)
+
+        results[key] = value
+
+    raise DecodeError('Dictionary must end with \'e\'.')
+
+
+def _parse_key(buf: bytes, idx: int, prev_key: bytes):
+    """
+    Decode a dictionary key and check that it sorts strictly after the previous key. Used when walking a
+    dictionary without building it; _parse_dictionary inlines the same checks.
+    :param buf: Input bytes string
+    :param idx: Index of the first byte of the key
+    :param prev_key: Previous key of the dictionary, or None for the first key
+    :return: Tuple of decoded key and index right after it
+    """
+    char = buf[idx]
+    if not _CHAR_0 <= char <= _CHAR_9:
+        raise DecodeError(f'Dictionary key must conform to string specification. '
+                          f'Found \'{chr(char)}\' at index {idx}.')
+
+    key, idx = _parse_string(buf, idx)
+    if prev_key is not None and key <= prev_key:
+        raise DecodeError('Keys must be strings and appear in sorted order '
+                          '(sorted as raw strings, not alphanumerics).')
+
+    return key, idx
+
+
+def _skip(buf: bytes, idx: int):
+    """
+    Validate the element starting at index idx like _parse, but without building it: integers are matched rather
+    than converted and string payloads are not copied.
+    :param buf: Input bytes string
+    :param idx: Index of the first byte of the element
+    :return: Index right after the element
+    """
+    if idx >= len(buf):
+        raise DecodeError(f'Unexpected end of input at index {idx}.')
+
+    return _SKIP_DISPATCH[buf[idx]](buf, idx)
+
+
+def _skip_int(buf: bytes, idx: int):
+    match = _INT_RE.match(buf, idx + 1)
+    if match is None:
+        # Let the parser raise the matching DecodeError.
+        return _parse_int(buf, idx)[1]
+
+    return match.end()
+
+
+def _skip_string(buf: bytes, idx: int):
+    match = _STRING_LENGTH_RE.match(buf, idx)
+    if match is not None:
+        end = match.end() + int(match.group(1))
+        if end <= len(buf):
+            return end
+
+    # Let the parser raise the matching DecodeError.
+    return _parse_string(buf, idx)[1]
+
+
+def _skip_list(buf: bytes, idx: int):
+    dispatch = _SKIP_DISPATCH
+    end = len(buf)
+    idx += 1
+
+    while idx < end:
+        char = buf[idx]
+        if char == _CHAR_E:
+            return idx + 1
+        idx = dispatch[char](buf, idx)
+
+    raise DecodeError('List must end with \'e\'.')
+
+
+def _skip_dictionary(buf: bytes, idx: int):
+    prev_key = None
+    end = len(buf)
+    idx += 1
+
+    while idx < end:
+        if buf[idx] == _CHAR_E:
+            return idx + 1
+        prev_key, idx = _parse_key(buf, idx, prev_key)
+        idx = _skip(buf, idx)
+
+    raise DecodeError('Dictionary must end with \'e\'.')
+
+
+def _find_value(buf: bytes, idx: int, key: bytes):
+    """
+    Find the value of key in the dictionary starting at index idx, skipping the values of the other keys.
+    :param buf: Input bytes string
+    :param idx: Index of the first byte of the dictionary
+    :param key: Key to look for
+    :return: Index of the first byte of the value
+    :raise KeyError: If the element is not a dictionary or does not contain key
+    """
+    if idx >= len(buf) or buf[idx] != _CHAR_D:
+        raise KeyError(key)
+
+    prev_key = None
+    idx += 1
+
+    while idx < len(buf) and buf[idx] != _CHAR_E:
+        prev_key, idx = _parse_key(buf, idx, prev_key)
+        if prev_key == key:
+            return idx
+        if prev_key > key:
+            # Keys are sorted, so key cannot appear later.
+            raise KeyError(key)
+        idx = _skip(buf, idx)
+
+    if idx >= len(buf):
+        raise DecodeError('Dictionary must end with \'e\'.')
+
+    raise KeyError(key)
+
+
+# Parser of an element indexed by its first byte.
+_DISPATCH = [_parse_invalid] * 256
+_DISPATCH[_CHAR_I] = _parse_int
+_DISPATCH[_CHAR_L] = _parse_list
+_DISPATCH[_CHAR_D] = _parse_dictionary
+for _char in range(_CHAR_0, _CHAR_9 + 1):
+    _DISPATCH[_char] = _parse_string
+
+_SKIP_DISPATCH = [_parse_invalid] * 256
+_SKIP_DISPATCH[_CHAR_I] = _skip_int
+_SKIP_DISPATCH[_CHAR_L] = _skip_list
+_SKIP_DISPATCH[_CHAR_D] = _skip_dictionary
+for _char in range(_CHAR_0, _CHAR_9 + 1):
+    _SKIP_DISPATCH[_char] = _skip_string
+del _char
+
+
 class BencodeDecoder:
     def __init__(self, encoding='UTF-8'):
         self.encoding = encoding
@@ -19,16 +315,8 @@ class BencodeDecoder:
             dict: self.decode_dictionary,
             bytes: self.decode_string_bytes
         }
-        self.__char_i = 'i'.encode(self.encoding)[0]
-        self.__char_l = 'l'.encode(self.encoding)[0]
-        self.__char_d = 'd'.encode(self.encoding)[0]
-        self.__char_e = 'e'.encode(self.encoding)[0]
-        self.__char_0 = '0'.encode(self.encoding)[0]
-        self.__char_9 = '9'.encode(self.encoding)[0]
-        self.__char_colon = ':'.encode(self.encoding)[0]
-        self.__char_hyphen = '-'.encode(self.encoding)[0]
-
-    def decode_int(self, inp: bytes):
+
+    def decode_int(self, inp: bytes or memoryview):
         """
         Integers are represented by an 'i' followed by the number in base 10 followed by an 'e'.
         For example i3e corresponds to 3 and i-3e corresponds to -3. Integers have no size limitation. i-0e is invalid.
@@ -36,127 +324,39 @@ class BencodeDecoder:
         :param inp: Input bytes string
         :return: Decoded integer
         """
-        if inp[0] != self.__char_i or inp[-1] != self.__char_e:
-            raise DecodeError(f'To decode integer, input must begin with \'i\' and end with \'e\'. '
-                              f'Input: {inp}.')
-
-        try:
-            result = int(inp[1: -1])
-        except ValueError:
-            raise DecodeError(f'Integer must be encoded in base ten ASCII. '
-                              f'Input: {inp}.')
-
-        if result == 0 and inp[1] == self.__char_hyphen:
-            raise DecodeError(f'Negative zero is not permitted. Input: {inp}.')
-
-        if result != 0 and ((inp[1] == self.__char_hyphen and inp[2] == self.__char_0)
-                            or (inp[1] == self.__char_0)):
-            raise DecodeError(f'Leading zeros are not allowed. Input: {inp}.')
+        if not inp or inp[0] != _CHAR_I:
+            raise DecodeError(lambda: f'To decode integer, input must begin with \'i\' and end with \'e\'. '
+                                      f'Input: {inp}.')
 
-        return result
+        return self._decode_whole(inp)
 
-    def decode_string_bytes(self, inp: bytes):
+    def decode_string_bytes(self, inp: bytes or memoryview):
         """
         Strings are length-prefixed base ten followed by a colon and the string.
         For example 4:spam corresponds to 'spam'.
         :param inp: Input bytes string
         :return: Decoded bytes string
         """
-        colon_pos = inp.find(self.__char_colon)
-
-        if colon_pos == -1:
-            raise DecodeError(f'String must contain colon \':\'. Input: {inp}.')
-
-        try:
-            string_length = int(inp[:colon_pos])
-            if string_length <= 0:
-                raise ValueError
-        except ValueError:
-            raise DecodeError(f'Prefixed string before colon must be an integer and higher than 0. Input: \'{inp}\'')
+        if not inp or not _CHAR_0 <= inp[0] <= _CHAR_9:
+            raise DecodeError(lambda: f'Prefixed string before colon must be an integer and higher than 0. '
+                                      f'Input: \'{inp}\'')
 
-        if string_length != len(inp[colon_pos + 1:]):
-            raise DecodeError(f'String length and predefined length do not match. '
-                              f'String length: {string_length}, predefined length: {len(inp[colon_pos + 1:])}. '
-                              f'Input: \'{inp}\'')
+        return self._decode_whole(inp)
 
-        return inp[colon_pos + 1:]
-
-    def decode_list(self, inp: bytes):
+    def decode_list(self, inp: bytes or memoryview):
         """
         Lists are encoded as an 'l' followed by their elements (also bencoded) followed by an 'e'.
         For example l4:spam4:eggse corresponds to ['spam', 'eggs'].
         :param inp: Input bytes string
         :return: Decoded list
         """
-        if inp[0] != self.__char_l or inp[-1] != self.__char_e:
-            raise DecodeError(f'To decode list, input must begin with \'l\' and end with \'e\'. '
-                              f'Input: {inp}.')
-
-        results = list()
-        idx = 1
-
-        while idx < len(inp) - 1:
-            if inp[idx] == self.__char_i:  # Decode integer
-                ending_e = inp.find(self.__char_e, idx + 1)
-                inp_ = inp[idx: ending_e + 1]
-                try:
-                    result = self.decode_int(inp_)
-                    idx = ending_e + 1
-                except DecodeError:
-                    raise DecodeError(f'Cannot decode integer from {inp_}.')
-            elif inp[idx] == self.__char_l:  # Decode list
-                ending_e = inp.find(self.__char_e, idx + 1)
-                if ending_e == -1:
-                    raise DecodeError(f'Cannot decode list from index {idx}.')
-                while ending_e != -1:
-                    inp_ = inp[idx: ending_e + 1]
-                    try:
-                        result = self.decode_list(inp_)
-                        idx = ending_e + 1
-                        break
-                    except DecodeError:
-                        ending_e = inp.find(self.__char_e, ending_e + 1)
-                    if ending_e == -1:
-                        raise DecodeError(f'Cannot decode list from {inp_}.')
-
-            elif inp[idx] == self.__char_d:  # Decode dictionary
-                ending_e = inp.find(self.__char_e, idx + 1)
-                if ending_e == -1:
-                    raise DecodeError(f'Cannot decode dictionary from index {idx}.')
-                while ending_e != -1:
-                    inp_ = inp[idx: ending_e + 1]
-                    try:
-                        result = self.decode_dictionary(inp_)
-                        idx = ending_e + 1
-                        break
-                    except DecodeError:
-                        ending_e = inp.find(self.__char_e, ending_e + 1)
-                    if ending_e == -1:
-                        raise DecodeError(f'Cannot decode dictionary from index {idx}.')
-            elif self.__char_0 <= inp[idx] <= self.__char_9:  # Decode string
-                colon = inp.find(self.__char_colon, idx + 1)
-                try:
-                    str_len = int(inp[idx: colon])
-                    if str_len <= 0:
-                        raise ValueError
-                except ValueError:
-                    raise DecodeError(f'Prefixed string before colon must be an integer and higher than 0. '
+        if not inp or inp[0] != _CHAR_L:
+            raise DecodeError(lambda: f'To decode list, input must begin with \'l\' and end with \'e\'. '
                                       f'Input: {inp}.')
 
-                inp_ = inp[idx: colon + str_len + 1]
-                try:
-                    result = self.decode_string_bytes(inp_)
-                    idx = colon + str_len + 1
-                except DecodeError:
-                    raise DecodeError(f'Cannot decode string from {inp_}.')
-            else:
-                raise DecodeError(f'Cannot infer type from character {inp[idx]} '
-                                  f'at index {idx} in input {inp}.')
-            results.append(result)
-
-        return results
+        return self._decode_whole(inp)
 
-    def decode_dictionary(self, inp: bytes):
+    def decode_dictionary(self, inp: bytes or memoryview):
         """
         Dictionaries are encoded as a 'd' followed by a list of alternating keys and their corresponding values
         followed by an 'e'. For example, d3:cow3:moo4:spam4:eggse corresponds to {'cow': 'moo', 'spam': 'eggs'} and
@@ -165,92 +365,75 @@ class BencodeDecoder:
         :param inp: Input bytes string
         :return: Decoded dictionary
         """
-        if inp[0] != self.__char_d or inp[-1] != self.__char_e:
-            raise DecodeError(f'To decode dictionary, input must begin with \'d\' and end with \'e\'. '
-                              f'Input: {inp}.')
-
-        results = OrderedDict()
-        keys = []
-        idx = 1
-
-        while idx < len(inp) - 2:
-            # Extract key (string)
-            if not self.__char_0 <= inp[idx] <= self.__char_9:
-                raise DecodeError(f'Dictionary key must conform to string specification. '
-                                  f'Found {inp[idx]} at index {idx}. Input: {inp}.')
-
-            colon = inp.find(self.__char_colon, idx + 1)
-            try:
-                str_len = int(inp[idx: colon])
-                if str_len <= 0:
-                    raise ValueError
-            except ValueError:
-                raise DecodeError(
-                    f'Prefixed string before colon must be an integer and higher than 0. Input: {inp}.')
-            inp_ = inp[idx: colon + str_len + 1]
-            idx = colon + str_len + 1
-            try:
-                key = self.decode_string_bytes(inp_)
-            except DecodeError:
-                raise DecodeError(f'Cannot decode string from {inp_}.')
-
-            # Extract value
-            if inp[idx] == self.__char_i:  # Decode integer
-                ending_e = inp.find(self.__char_e, idx + 1)
-                inp_ = inp[idx: ending_e + 1]
-                idx = ending_e + 1
-                try:
-                    value = self.decode_int(inp_)
-                except DecodeError:
-                    raise DecodeError(f'Cannot decode integer from {inp_}.')
-            elif inp[idx] == self.__char_l:  # Decode list
-                ending_e = inp.find(self.__char_e, idx + 1)
-                inp_ = inp[idx: ending_e + 1]
-                idx = ending_e + 1
-                try:
-                    value = self.decode_list(inp_)
-                except DecodeError:
-                    raise DecodeError(f'Cannot decode list from {inp_}.')
-            elif inp[idx] == self.__char_d:  # Decode dictionary
-                ending_e = inp.find(self.__char_e, idx + 1)
-                if ending_e == -1:
-                    raise DecodeError(f'Cannot decode dictionary from index {idx}.')
-                while ending_e != -1:
-                    inp_ = inp[idx: ending_e + 1]
-                    try:
-                        value = self.decode_dictionary(inp_)
-                        idx = ending_e + 1
-                        break
-                    except DecodeError:
-                        # raise DecodeError(f'Cannot decode dictionary from {inp_}.')
-                        ending_e = inp.find(self.__char_e, ending_e + 1)
-                    if ending_e == -1:
-                        raise DecodeError(f'Cannot decode dictionary from index {idx}.')
-            elif self.__char_0 <= inp[idx] <= self.__char_9:  # Decode string
-                colon = inp.find(self.__char_colon, idx + 1)
-                try:
-                    str_len = int(inp[idx: colon])
-                    if str_len <= 0:
-                        raise ValueError
-                except ValueError:
-                    raise DecodeError(
-                        f'Prefixed string before colon must be an integer and higher than 0. Input: {inp}.')
-
-                inp_ = inp[idx: colon + str_len + 1]
-                idx = colon + str_len + 1
-                try:
-                    value = self.decode_string_bytes(inp_)
-                except DecodeError:
-                    raise DecodeError(f'Cannot decode string from {inp_}.')
+        if not inp or inp[0] != _CHAR_D:
+            raise DecodeError(lambda: f'To decode dictionary, input must begin with \'d\' and end with \'e\'. '
+                                      f'Input: {inp}.')
+
+        return self._decode_whole(inp)
+
+    def decode_skip(self, inp: bytes or memoryview):
+        """
+        Validate that the input is a single well-formed bencoded element without building any of it. Raises
+        DecodeError like the decode methods do.
+        :param inp: Input bytes string
+        """
+        inp = _as_buffer(inp)
+
+        try:
+            if _native is not None:
+                idx = _native.skip(inp, 0)
             else:
-                raise DecodeError(f'Cannot infer type from character \'{inp[idx]}\' '
-                                  f'at index {idx} in input {inp}.')
+                idx = _skip(inp, 0)
+        except RecursionError as e:
+            raise DecodeError('Input is nested too deeply.') from e
 
-            results[key] = value
-            keys.append(key)
+        if idx != len(inp):
+            raise DecodeError(lambda: f'Unexpected trailing data at index {idx}. Input: {bytes(inp)}.')
 
-        if keys != sorted(keys):
-            raise DecodeError(f'Keys must be strings and appear in sorted order '
-                              f'(sorted as raw strings, not alphanumerics).')
+    def decode_pick(self, inp: bytes or memoryview, path: tuple):
+        """
+        Decode only the element reached by following path through nested dictionaries, e.g. (b'info', b'name') of a
+        torrent or (b't',) of a DHT message. Elements before it are validated but not built, and parsing stops right
+        after it, so the rest of the input is not validated.
+        :param inp: Input bytes string
+        :param path: Keys of the nested dictionaries, as bytes or strings in the decoder's encoding
+        :return: Decoded element
+        :raise KeyError: If a key of path is not found
+        """
+        inp = _as_buffer(inp)
+
+        find_value = _native.find_value if _native is not None else _find_value
+        idx = 0
+        try:
+            for key in path:
+                if isinstance(key, str):
+                    key = key.encode(self.encoding)
+                idx = find_value(inp, idx, key)
+
+            if _native is not None:
+                return _native.parse(inp, idx)[0]
+            return _parse(inp, idx)[0]
+        except RecursionError as e:
+            raise DecodeError('Input is nested too deeply.') from e
+
+    def _decode_whole(self, inp: bytes):
+        """
+        Decode a single element which must span the whole input. The parser works on offsets and only copies the
+        string payloads it returns.
+        :param inp: Input bytes string or bytes-like object
+        :return: Decoded element
+        """
+        inp = _as_buffer(inp)
+
+        try:
+            if _native is not None:
+                result, idx = _native.parse(inp, 0)
+            else:
+                result, idx = _parse(inp, 0)
+        except RecursionError as e:
+            raise DecodeError('Input is nested too deeply.') from e
+
+        if idx != len(inp):
+            raise DecodeError(lambda: f'Unexpected trailing data at index {idx}. Input: {bytes(inp)}.')
 
-        return results
+        return result
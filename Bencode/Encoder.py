@@ -1,5 +1,4 @@
 # References: http://bittorrent.org/beps/bep_0003.html
-from collections import OrderedDict
 
 
 class EncodeError(Exception):
@@ -14,13 +13,6 @@ class EncodeError(Exception):
 class BencodeEncoder:
     def __init__(self, encoding='UTF-8'):
         self.encoding = encoding
-        self.ops = {
-            int: self.encode_int,
-            str: self.encode_string,
-            bytes: self.encode_string,
-            dict: self.encode_dict,
-            list: self.encode_list
-        }
 
     def encode_int(self, obj: int) -> bytes:
         """
@@ -30,7 +22,16 @@ class BencodeEncoder:
         :param obj: Integer number
         :return: Bytes string of encoded number
         """
-        return f'i{obj}e'.encode(self.encoding)
+        # bool is a subclass of int, but True must not silently become i1e.
+        if isinstance(obj, bool):
+            raise EncodeError(f'Unsupported object type \'{type(obj)}\' of object \'{obj}\'.')
+
+        out = bytearray()
+        self._encode_int(obj, out.extend)
+        return bytes(out)
+
+    def _encode_int(self, obj: int, write):
+        write(b'i%de' % obj)
 
     def encode_string(self, obj: str or bytes) -> bytes:
         """
@@ -39,10 +40,16 @@ class BencodeEncoder:
         :param obj: String or byte string
         :return: Bytes string of encoded string
         """
-        if type(obj) is str:
+        out = bytearray()
+        self._encode_string(obj, out.extend)
+        return bytes(out)
+
+    def _encode_string(self, obj: str or bytes, write):
+        if isinstance(obj, str):
             obj = obj.encode(self.encoding)
 
-        return f'{len(obj)}:'.encode(self.encoding) + obj
+        write(b'%d:' % len(obj))
+        write(obj)
 
     def encode_dict(self, obj: dict) -> bytes:
         """
@@ -53,21 +60,37 @@ class BencodeEncoder:
         :param obj: Dictionary
         :return: Bytes string of encoded dictionary
         """
-        res = 'd'.encode(self.encoding)
-
-        # Convert dictionary's keys to bytes for sorting.
-        byte_key_dict = dict()
-        for key, value in obj.items():
-            byte_key_dict[key.encode(self.encoding, 'strict')] = value
+        out = bytearray()
+        self._encode_dict(obj, out.extend)
+        return bytes(out)
 
-        sorted_byte_key_dict = OrderedDict(sorted(byte_key_dict.items(), key=lambda x: x[0]))
+    def _encode_dict(self, obj: dict, write):
+        # Sort by keys as bytes. Keys that are already bytes, as returned by the decoder, are used as is.
+        encode_key = self._encode_key
+        items = sorted(((encode_key(key), value) for key, value in obj.items()), key=lambda x: x[0])
 
         # Encode
-        for key, value in sorted_byte_key_dict.items():
-            res += self.encode_string(key) + self.ops[type(value)](value)
+        write(b'd')
+        encode_string = self._encode_string
+        encode = self._encode
+        prev_key = None
+        for key, value in items:
+            if key == prev_key:
+                raise EncodeError(f'Duplicate dictionary key {key!r} after encoding keys to bytes.')
+            prev_key = key
 
-        res += 'e'.encode(self.encoding)
-        return res
+            encode_string(key, write)
+            encode(value, write)
+
+        write(b'e')
+
+    def _encode_key(self, key: str or bytes) -> bytes:
+        if isinstance(key, str):
+            return key.encode(self.encoding, 'strict')
+        if isinstance(key, bytes):
+            return key
+
+        raise EncodeError(f'Unsupported dictionary key type \'{type(key)}\' of key \'{key}\'.')
 
     def encode_list(self, obj: list) -> bytes:
         """
@@ -76,21 +99,52 @@ class BencodeEncoder:
         :param obj: List of elements
         :return: String of encoded list
         """
-        res = 'l'.encode(self.encoding)
-        for element in obj:
-            print(element)
-            if type(element) not in [list, int, dict, str, bytes]:
-                raise EncodeError(f'Unsupported element type \'{type(element)}\' of element \'{element}\'.')
+        out = bytearray()
+        self._encode_list(obj, out.extend)
+        return bytes(out)
 
-            op = self.ops[type(element)]
-            res += op(element)
-        res += 'e'.encode(self.encoding)
-        return res
+    def _encode_list(self, obj: list, write):
+        write(b'l')
+        encode = self._encode
+        for element in obj:
+            encode(element, write)
+        write(b'e')
 
     def encode(self, obj) -> bytes:
-        if type(obj) not in [list, int, dict, str, bytes]:
-            raise EncodeError(f'Unsupported object type \'{type(obj)}\' of object \'{obj}\'.')
+        out = bytearray()
+        self._encode(obj, out.extend)
+        return bytes(out)
+
+    def encode_to(self, obj, writer):
+        """
+        Encode obj directly into a file-like object, e.g. a .torrent file opened in binary mode. Unlike encode, the
+        whole output is never held in memory, which matters for torrents with a large 'pieces' string.
+        Types are checked while writing, so after an EncodeError the writer holds the partial output written before
+        the unsupported element. Write into a temporary file and rename it afterwards to never leave a truncated
+        .torrent file behind.
+        :param obj: Object to encode
+        :param writer: Object with a write method accepting bytes
+        :raise EncodeError: If obj contains an unsupported type, after part of it may have been written
+        """
+        self._encode(obj, writer.write)
 
-        op = self.ops[type(obj)]
-        res = op(obj)
-        return res
+    def _encode(self, obj, write):
+        """
+        Pass the encoding of obj to write piece by piece. All encoders share the same sink, so nested elements are
+        never copied into intermediate bytes strings.
+        :param obj: Object to encode
+        :param write: Callable accepting bytes, e.g. bytearray.extend or the write method of a file
+        """
+        # bool is a subclass of int, but True must not silently become i1e.
+        if isinstance(obj, bool):
+            raise EncodeError(f'Unsupported object type \'{type(obj)}\' of object \'{obj}\'.')
+        elif isinstance(obj, int):
+            self._encode_int(obj, write)
+        elif isinstance(obj, (bytes, str)):
+            self._encode_string(obj, write)
+        elif isinstance(obj, dict):
+            self._encode_dict(obj, write)
+        elif isinstance(obj, list):
+            self._encode_list(obj, write)
+        else:
+            raise EncodeError(f'Unsupported object type \'{type(obj)}\' of object \'{obj}\'.')
@@ -0,0 +1,576 @@
+/*
+ * Native counterpart of the pure-Python parser in Decoder.py, used by BencodeDecoder when the extension is built.
+ * Both implementations must accept and reject exactly the same input.
+ */
+#define PY_SSIZE_T_CLEAN
+#include <Python.h>
+#include <string.h>
+
+#define IS_DIGIT(c) ((c) >= '0' && (c) <= '9')
+
+/* Kind of element that starts with a given byte, like _DISPATCH in Decoder.py. */
+enum {
+    CLASS_INVALID = 0,
+    CLASS_INT,
+    CLASS_STRING,
+    CLASS_LIST,
+    CLASS_DICTIONARY
+};
+
+static const unsigned char byte_class[256] = {
+    ['i'] = CLASS_INT,
+    ['l'] = CLASS_LIST,
+    ['d'] = CLASS_DICTIONARY,
+    ['0'] = CLASS_STRING,
+    ['1'] = CLASS_STRING,
+    ['2'] = CLASS_STRING,
+    ['3'] = CLASS_STRING,
+    ['4'] = CLASS_STRING,
+    ['5'] = CLASS_STRING,
+    ['6'] = CLASS_STRING,
+    ['7'] = CLASS_STRING,
+    ['8'] = CLASS_STRING,
+    ['9'] = CLASS_STRING
+};
+
+static PyObject *parse(const char *buf, Py_ssize_t len, Py_ssize_t *idx);
+static int skip(const char *buf, Py_ssize_t len, Py_ssize_t *idx);
+
+/* DecodeError of Decoder.py, passed in once through set_error() right after this module is imported. */
+static PyObject *decode_error_type = NULL;
+
+static PyObject *
+decode_error(const char *format, ...)
+{
+    va_list vargs;
+
+    va_start(vargs, format);
+    PyErr_FormatV(decode_error_type != NULL ? decode_error_type : PyExc_ValueError, format, vargs);
+    va_end(vargs);
+    return NULL;
+}
+
+/* Value of the length prefix buf[start:end], or -1 if it is not base ten ASCII. Saturates at PY_SSIZE_T_MAX. */
+static inline Py_ssize_t
+scan_length(const char *buf, Py_ssize_t start, Py_ssize_t end)
+{
+    Py_ssize_t length = 0, i;
+
+    for (i = start; i < end; i++) {
+        if (!IS_DIGIT(buf[i]))
+            return -1;
+        if (length > (PY_SSIZE_T_MAX - 9) / 10)
+            length = PY_SSIZE_T_MAX;
+        else
+            length = length * 10 + (buf[i] - '0');
+    }
+    return length;
+}
+
+/* Value of the ASCII digits buf[start:end]. At most 18 digits always fit in a long long. */
+static inline long long
+parse_digits(const char *buf, Py_ssize_t start, Py_ssize_t end)
+{
+    long long value = 0;
+    Py_ssize_t i;
+
+    for (i = start; i < end; i++)
+        value = value * 10 + (buf[i] - '0');
+    return value;
+}
+
+/*
+ * Validate the integer starting at *idx and move *idx past it. The digits without sign are buf[*digits:*end].
+ * Return 0 on success, or -1 with DecodeError set.
+ */
+static int
+scan_int(const char *buf, Py_ssize_t len, Py_ssize_t *idx, Py_ssize_t *digits, Py_ssize_t *end, int *negative)
+{
+    Py_ssize_t i, j;
+    const char *ending_e;
+
+    ending_e = memchr(buf + *idx + 1, 'e', len - *idx - 1);
+    if (ending_e == NULL) {
+        decode_error("Integer at index %zd must end with 'e'.", *idx);
+        return -1;
+    }
+    *end = ending_e - buf;
+
+    i = *idx + 1;
+    *negative = i < *end && buf[i] == '-';
+    if (*negative)
+        i++;
+    if (i == *end) {
+        decode_error("Integer must be encoded in base ten ASCII. Input at index %zd.", *idx);
+        return -1;
+    }
+    for (j = i; j < *end; j++) {
+        if (!IS_DIGIT(buf[j])) {
+            decode_error("Integer must be encoded in base ten ASCII. Input at index %zd.", *idx);
+            return -1;
+        }
+    }
+    if (buf[i] == '0') {
+        if (*end - i > 1) {
+            decode_error("Leading zeros are not allowed. Input at index %zd.", *idx);
+            return -1;
+        }
+        if (*negative) {
+            decode_error("Negative zero is not permitted. Input at index %zd.", *idx);
+            return -1;
+        }
+    }
+
+    *digits = i;
+    *idx = *end + 1;
+    return 0;
+}
+
+static PyObject *
+parse_int(const char *buf, Py_ssize_t len, Py_ssize_t *idx)
+{
+    Py_ssize_t digits, end;
+    int negative;
+    PyObject *body, *result;
+
+    if (scan_int(buf, len, idx, &digits, &end, &negative) < 0)
+        return NULL;
+
+    if (end - digits <= 18) {
+        long long value = parse_digits(buf, digits, end);
+        return PyLong_FromLongLong(negative ? -value : value);
+    }
+
+    /* PyLong_FromString needs a NUL-terminated string, which a bytes object provides. */
+    body = PyBytes_FromStringAndSize(buf + digits - negative, end - digits + negative);
+    if (body == NULL)
+        return NULL;
+    result = PyLong_FromString(PyBytes_AS_STRING(body), NULL, 10);
+    Py_DECREF(body);
+    return result;
+}
+
+/*
+ * Validate the string starting at *idx and move *idx past it. The payload is buf[*start:*start + *str_len].
+ * Return 0 on success, or -1 with DecodeError set.
+ */
+static int
+scan_string(const char *buf, Py_ssize_t len, Py_ssize_t *idx, Py_ssize_t *start, Py_ssize_t *str_len)
+{
+    const char *colon;
+
+    colon = memchr(buf + *idx + 1, ':', len - *idx - 1);
+    if (colon == NULL) {
+        decode_error("String at index %zd must contain colon ':'.", *idx);
+        return -1;
+    }
+
+    *str_len = scan_length(buf, *idx, colon - buf);
+    if (*str_len <= 0) {
+        decode_error("Prefixed string before colon must be an integer and higher than 0. "
+                     "Input at index %zd.", *idx);
+        return -1;
+    }
+
+    *start = colon - buf + 1;
+    if (*str_len > len - *start) {
+        decode_error("String length and predefined length do not match. "
+                     "String length: %zd, predefined length: %zd.", len - *start, *str_len);
+        return -1;
+    }
+
+    *idx = *start + *str_len;
+    return 0;
+}
+
+static PyObject *
+parse_string(const char *buf, Py_ssize_t len, Py_ssize_t *idx)
+{
+    Py_ssize_t start, str_len;
+
+    if (scan_string(buf, len, idx, &start, &str_len) < 0)
+        return NULL;
+    return PyBytes_FromStringAndSize(buf + start, str_len);
+}
+
+/* Compare two byte strings like bytes objects do. */
+static inline int
+compare_strings(const char *a, Py_ssize_t a_len, const char *b, Py_ssize_t b_len)
+{
+    int result = memcmp(a, b, a_len < b_len ? a_len : b_len);
+
+    if (result != 0)
+        return result;
+    return (a_len > b_len) - (a_len < b_len);
+}
+
+/*
+ * Validate the dictionary key starting at *idx, check that it sorts strictly after the previous key
+ * buf[*start:*start + *str_len] (none if *start is -1) and move *idx past it. On success the key replaces the
+ * previous one in *start and *str_len. Return 0 on success, or -1 with DecodeError set.
+ */
+static int
+scan_key(const char *buf, Py_ssize_t len, Py_ssize_t *idx, Py_ssize_t *start, Py_ssize_t *str_len)
+{
+    Py_ssize_t key_start, key_len;
+
+    if (!IS_DIGIT(buf[*idx])) {
+        decode_error("Dictionary key must conform to string specification. Found '%c' at index %zd.",
+                     (unsigned char)buf[*idx], *idx);
+        return -1;
+    }
+    if (scan_string(buf, len, idx, &key_start, &key_len) < 0)
+        return -1;
+    if (*start >= 0 && compare_strings(buf + *start, *str_len, buf + key_start, key_len) >= 0) {
+        decode_error("Keys must be strings and appear in sorted order "
+                     "(sorted as raw strings, not alphanumerics).");
+        return -1;
+    }
+
+    *start = key_start;
+    *str_len = key_len;
+    return 0;
+}
+
+static PyObject *
+parse_list(const char *buf, Py_ssize_t len, Py_ssize_t *idx)
+{
+    PyObject *results, *result;
+
+    results = PyList_New(0);
+    if (results == NULL)
+        return NULL;
+    (*idx)++;
+
+    while (*idx < len && buf[*idx] != 'e') {
+        result = parse(buf, len, idx);
+        if (result == NULL)
+            goto error;
+        if (PyList_Append(results, result) < 0) {
+            Py_DECREF(result);
+            goto error;
+        }
+        Py_DECREF(result);
+    }
+
+    if (*idx >= len) {
+        decode_error("List must end with 'e'.");
+        goto error;
+    }
+
+    (*idx)++;
+    return results;
+
+error:
+    Py_DECREF(results);
+    return NULL;
+}
+
+static PyObject *
+parse_dictionary(const char *buf, Py_ssize_t len, Py_ssize_t *idx)
+{
+    PyObject *results, *key = NULL, *value = NULL;
+    Py_ssize_t key_start = -1, key_len = 0;
+
+    results = PyDict_New();
+    if (results == NULL)
+        return NULL;
+    (*idx)++;
+
+    while (*idx < len && buf[*idx] != 'e') {
+        /* Extract key (string) */
+        if (scan_key(buf, len, idx, &key_start, &key_len) < 0)
+            goto error;
+        key = PyBytes_FromStringAndSize(buf + key_start, key_len);
+        if (key == NULL)
+            goto error;
+
+        /* Extract value */
+        value = parse(buf, len, idx);
+        if (value == NULL)
+            goto error;
+
+        if (PyDict_SetItem(results, key, value) < 0)
+            goto error;
+        Py_CLEAR(key);
+        Py_CLEAR(value);
+    }
+
+    if (*idx >= len) {
+        decode_error("Dictionary must end with 'e'.");
+        goto error;
+    }
+
+    (*idx)++;
+    return results;
+
+error:
+    Py_XDECREF(key);
+    Py_XDECREF(value);
+    Py_DECREF(results);
+    return NULL;
+}
+
+static PyObject *
+parse(const char *buf, Py_ssize_t len, Py_ssize_t *idx)
+{
+    PyObject *result;
+    unsigned char c;
+
+    if (*idx >= len)
+        return decode_error("Unexpected end of input at index %zd.", *idx);
+
+    c = (unsigned char)buf[*idx];
+    switch (byte_class[c]) {
+    case CLASS_INT:
+        return parse_int(buf, len, idx);
+    case CLASS_STRING:
+        return parse_string(buf, len, idx);
+    case CLASS_LIST:
+        if (Py_EnterRecursiveCall(" while decoding bencode"))
+            return NULL;
+        result = parse_list(buf, len, idx);
+        Py_LeaveRecursiveCall();
+        return result;
+    case CLASS_DICTIONARY:
+        if (Py_EnterRecursiveCall(" while decoding bencode"))
+            return NULL;
+        result = parse_dictionary(buf, len, idx);
+        Py_LeaveRecursiveCall();
+        return result;
+    default:
+        return decode_error("Cannot infer type from character '%c' at index %zd.", c, *idx);
+    }
+}
+
+static int
+skip_list(const char *buf, Py_ssize_t len, Py_ssize_t *idx)
+{
+    (*idx)++;
+
+    while (*idx < len && buf[*idx] != 'e') {
+        if (skip(buf, len, idx) < 0)
+            return -1;
+    }
+
+    if (*idx >= len) {
+        decode_error("List must end with 'e'.");
+        return -1;
+    }
+
+    (*idx)++;
+    return 0;
+}
+
+static int
+skip_dictionary(const char *buf, Py_ssize_t len, Py_ssize_t *idx)
+{
+    Py_ssize_t key_start = -1, key_len = 0;
+
+    (*idx)++;
+
+    while (*idx < len && buf[*idx] != 'e') {
+        if (scan_key(buf, len, idx, &key_start, &key_len) < 0 || skip(buf, len, idx) < 0)
+            return -1;
+    }
+
+    if (*idx >= len) {
+        decode_error("Dictionary must end with 'e'.");
+        return -1;
+    }
+
+    (*idx)++;
+    return 0;
+}
+
+/* Validate the element starting at *idx like parse(), but only move *idx past it without building anything. */
+static int
+skip(const char *buf, Py_ssize_t len, Py_ssize_t *idx)
+{
+    Py_ssize_t start, end;
+    int negative, result;
+    unsigned char c;
+
+    if (*idx >= len) {
+        decode_error("Unexpected end of input at index %zd.", *idx);
+        return -1;
+    }
+
+    c = (unsigned char)buf[*idx];
+    switch (byte_class[c]) {
+    case CLASS_INT:
+        return scan_int(buf, len, idx, &start, &end, &negative);
+    case CLASS_STRING:
+        return scan_string(buf, len, idx, &start, &end);
+    case CLASS_LIST:
+        if (Py_EnterRecursiveCall(" while decoding bencode"))
+            return -1;
+        result = skip_list(buf, len, idx);
+        Py_LeaveRecursiveCall();
+        return result;
+    case CLASS_DICTIONARY:
+        if (Py_EnterRecursiveCall(" while decoding bencode"))
+            return -1;
+        result = skip_dictionary(buf, len, idx);
+        Py_LeaveRecursiveCall();
+        return result;
+    default:
+        decode_error("Cannot infer type from character '%c' at index %zd.", c, *idx);
+        return -1;
+    }
+}
+
+/*
+ * Find the value of key in the dictionary starting at *idx, skipping the values of the other keys, and move *idx
+ * to it. Return 0 on success, or -1 with KeyError or DecodeError set.
+ */
+static int
+find_value(const char *buf, Py_ssize_t len, Py_ssize_t *idx, PyObject *key)
+{
+    Py_ssize_t key_start = -1, key_len = 0;
+    int order;
+
+    if (*idx >= len || buf[*idx] != 'd') {
+        PyErr_SetObject(PyExc_KeyError, key);
+        return -1;
+    }
+    (*idx)++;
+
+    while (*idx < len && buf[*idx] != 'e') {
+        if (scan_key(buf, len, idx, &key_start, &key_len) < 0)
+            return -1;
+        order = compare_strings(buf + key_start, key_len, PyBytes_AS_STRING(key), PyBytes_GET_SIZE(key));
+        if (order == 0)
+            return 0;
+        if (order > 0) {
+            /* Keys are sorted, so key cannot appear later. */
+            PyErr_SetObject(PyExc_KeyError, key);
+            return -1;
+        }
+        if (skip(buf, len, idx) < 0)
+            return -1;
+    }
+
+    if (*idx >= len) {
+        decode_error("Dictionary must end with 'e'.");
+        return -1;
+    }
+
+    PyErr_SetObject(PyExc_KeyError, key);
+    return -1;
+}
+
+/* Parse the (buf, idx) arguments shared by the module functions. Return 0 on success, or -1 with an error set. */
+static int
+parse_buffer_args(PyObject *args, const char *format, Py_buffer *view, Py_ssize_t *idx, PyObject **key)
+{
+    int ok = key == NULL ? PyArg_ParseTuple(args, format, view, idx)
+                         : PyArg_ParseTuple(args, format, view, idx, &PyBytes_Type, key);
+
+    if (!ok)
+        return -1;
+    if (*idx < 0) {
+        PyBuffer_Release(view);
+        PyErr_SetString(PyExc_ValueError, "index must not be negative");
+        return -1;
+    }
+    return 0;
+}
+
+static PyObject *
+decoder_parse(PyObject *module, PyObject *args)
+{
+    Py_buffer view;
+    Py_ssize_t idx;
+    PyObject *result;
+
+    if (parse_buffer_args(args, "y*n:parse", &view, &idx, NULL) < 0)
+        return NULL;
+
+    result = parse(view.buf, view.len, &idx);
+    PyBuffer_Release(&view);
+    if (result == NULL)
+        return NULL;
+    return Py_BuildValue("(Nn)", result, idx);
+}
+
+static PyObject *
+decoder_skip(PyObject *module, PyObject *args)
+{
+    Py_buffer view;
+    Py_ssize_t idx;
+    int result;
+
+    if (parse_buffer_args(args, "y*n:skip", &view, &idx, NULL) < 0)
+        return NULL;
+
+    result = skip(view.buf, view.len, &idx);
+    PyBuffer_Release(&view);
+    if (result < 0)
+        return NULL;
+    return PyLong_FromSsize_t(idx);
+}
+
+static PyObject *
+decoder_find_value(PyObject *module, PyObject *args)
+{
+    Py_buffer view;
+    Py_ssize_t idx;
+    PyObject *key;
+    int result;
+
+    if (parse_buffer_args(args, "y*nO!:find_value", &view, &idx, &key) < 0)
+        return NULL;
+
+    result = find_value(view.buf, view.len, &idx, key);
+    PyBuffer_Release(&view);
+    if (result < 0)
+        return NULL;
+    return PyLong_FromSsize_t(idx);
+}
+
+static PyObject *
+decoder_set_error(PyObject *module, PyObject *error)
+{
+    if (!PyType_Check(error) || !PyType_IsSubtype((PyTypeObject *)error, (PyTypeObject *)PyExc_Exception)) {
+        PyErr_SetString(PyExc_TypeError, "error must be an exception class");
+        return NULL;
+    }
+
+    Py_INCREF(error);
+    Py_XSETREF(decode_error_type, error);
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef decoder_methods[] = {
+    {"set_error", decoder_set_error, METH_O,
+     "set_error(error)\n--\n\n"
+     "Set the exception class raised for malformed input. Until it is set, ValueError is raised."},
+    {"parse", decoder_parse, METH_VARARGS,
+     "parse(buf, idx)\n--\n\n"
+     "Decode the element starting at index idx of buf.\n"
+     "Return a tuple of the decoded element and the index right after it."},
+    {"skip", decoder_skip, METH_VARARGS,
+     "skip(buf, idx)\n--\n\n"
+     "Validate the element starting at index idx of buf without building it.\n"
+     "Return the index right after it."},
+    {"find_value", decoder_find_value, METH_VARARGS,
+     "find_value(buf, idx, key)\n--\n\n"
+     "Return the index of the value of the bytes key in the dictionary starting at index idx of buf.\n"
+     "Raise KeyError if the element is not a dictionary or does not contain key."},
+    {NULL, NULL, 0, NULL}
+};
+
+static struct PyModuleDef decoder_module = {
+    PyModuleDef_HEAD_INIT,
+    "_decoder",
+    "Native bencode parser used by Bencode.Decoder.",
+    -1,
+    decoder_methods
+};
+
+PyMODINIT_FUNC
+PyInit__decoder(void)
+{
+    return PyModule_Create(&decoder_module);
+}
@@ -0,0 +1,8 @@
+from setuptools import Extension, setup
+
+setup(
+    name='torrent-tool',
+    packages=['Bencode'],
+    # The native decoder is optional: BencodeDecoder falls back to the pure-Python parser when it is not built.
+    ext_modules=[Extension('Bencode._decoder', ['Bencode/_decoder.c'], optional=True)],
+)
@@ -0,0 +1,288 @@
+import io
+import tracemalloc
+import unittest
+from unittest import mock
+
+from Bencode import Decoder
+from Bencode.Decoder import BencodeDecoder, DecodeError
+from Bencode.Encoder import BencodeEncoder, EncodeError
+
+TORRENT = {
+    b'announce': b'http://tracker.example/announce',
+    b'info': {
+        b'files': [{b'length': i * 12345, b'path': [b'dir', b'file%d.bin' % i]} for i in range(50)],
+        b'name': b'example',
+        b'piece length': 262144,
+        b'pieces': bytes(range(256)) * 80,
+    },
+}
+
+# Inputs both parsers must accept, with the element they decode to.
+VALID = [
+    (b'i0e', 0),
+    (b'i3e', 3),
+    (b'i-3e', -3),
+    (b'i123456789012345678e', 123456789012345678),
+    (b'i-1234567890123456789012345e', -1234567890123456789012345),
+    (b'4:spam', b'spam'),
+    (b'03:abc', b'abc'),
+    (b'le', []),
+    (b'de', {}),
+    (b'l4:spam4:eggse', [b'spam', b'eggs']),
+    (b'lli1eei2eld1:ai1eeee', [[1], 2, [{b'a': 1}]]),
+    (b'd3:cow3:moo4:spam4:eggse', {b'cow': b'moo', b'spam': b'eggs'}),
+    (b'd4:spaml1:a1:bee', {b'spam': [b'a', b'b']}),
+    (b'd1:ad1:bd1:cleeee', {b'a': {b'b': {b'c': []}}}),
+    (b'd1:a1:xe', {b'a': b'x'}),
+]
+
+# Inputs both parsers must reject with DecodeError.
+INVALID = [
+    b'', b'x', b'e',
+    b'i', b'ie', b'i3', b'i-e', b'i--1e', b'i-0e', b'i03e', b'i-03e', b'i00e',
+    b'i 3e', b'i3 e', b'i+3e', b'i1_0e', b'i3.0e',
+    b'0:', b'4spam', b'4:spa', b'x:a', b'1 :a', b'1_0:aaaaaaaaaa', b'-1:a', b'99999999999999999999999:a',
+    b'l', b'l1:a', b'lxe', b'l\xffe', b'li1e',
+    b'd', b'd1:a', b'd1:ae', b'di1ei2ee', b'd1:ai1e', b'dle',
+    b'd1:bi1e1:ai2ee', b'd1:ai1e1:ai2ee', b'd2:abi1e1:ai2ee',
+]
+
+
+class ParseMixin:
+    """Accept/reject corpus shared by the pure-Python and the native parser, which must behave identically."""
+
+    parse = None
+
+    def test_valid(self):
+        for inp, expected in VALID:
+            with self.subTest(inp=inp):
+                self.assertEqual(self.parse(inp, 0), (expected, len(inp)))
+
+    def test_invalid(self):
+        for inp in INVALID:
+            with self.subTest(inp=inp):
+                with self.assertRaises(DecodeError):
+                    result, idx = self.parse(inp, 0)
+                    # Some inputs only fail as a whole because of trailing data.
+                    if idx != len(inp):
+                        raise DecodeError('Trailing data.')
+
+    def test_offset(self):
+        self.assertEqual(self.parse(b'xxli1ee', 2), ([1], 7))
+
+
+class SkipMixin:
+    """Skipping must accept and reject the same inputs as parsing, and find values by key."""
+
+    skip = None
+    find_value = None
+
+    def test_valid(self):
+        for inp, _ in VALID:
+            with self.subTest(inp=inp):
+                self.assertEqual(self.skip(inp, 0), len(inp))
+
+    def test_invalid(self):
+        for inp in INVALID:
+            with self.subTest(inp=inp):
+                with self.assertRaises(DecodeError):
+                    if self.skip(inp, 0) != len(inp):
+                        raise DecodeError('Trailing data.')
+
+    def test_find_value(self):
+        inp = b'd1:ai1e1:bli2ee1:cd1:di3eee'
+        self.assertEqual(self.find_value(inp, 0, b'b'), 10)
+        self.assertEqual(self.find_value(inp, self.find_value(inp, 0, b'c'), b'd'), 22)
+
+    def test_find_value_miss(self):
+        for inp, key in ((b'd1:ai1ee', b'b'), (b'd1:ai1ee', b'0'), (b'li1ee', b'a'), (b'', b'a')):
+            with self.subTest(inp=inp, key=key):
+                with self.assertRaises(KeyError):
+                    self.find_value(inp, 0, key)
+
+    def test_find_value_stops_early(self):
+        # Keys are sorted, so the search stops at b'c' before reaching the malformed rest.
+        with self.assertRaises(KeyError):
+            self.find_value(b'd1:ai1e1:ci2e1:xi03e', 0, b'b')
+        self.assertEqual(self.find_value(b'd1:ai1e1:bi2e1:xi03e', 0, b'b'), 10)
+
+    def test_find_value_unterminated(self):
+        with self.assertRaises(DecodeError):
+            self.find_value(b'd1:ai1e', 0, b'b')
+
+
+class PythonParseTest(ParseMixin, unittest.TestCase):
+    parse = staticmethod(Decoder._parse)
+
+
+@unittest.skipIf(Decoder._native is None, 'native extension is not built')
+class NativeParseTest(ParseMixin, unittest.TestCase):
+    parse = staticmethod(Decoder._native.parse if Decoder._native is not None else None)
+
+
+class PythonSkipTest(SkipMixin, unittest.TestCase):
+    skip = staticmethod(Decoder._skip)
+    find_value = staticmethod(Decoder._find_value)
+
+
+@unittest.skipIf(Decoder._native is None, 'native extension is not built')
+class NativeSkipTest(SkipMixin, unittest.TestCase):
+    skip = staticmethod(Decoder._native.skip if Decoder._native is not None else None)
+    find_value = staticmethod(Decoder._native.find_value if Decoder._native is not None else None)
+
+
+class DeepNestingTest(unittest.TestCase):
+    """Hostile nesting must surface as DecodeError from every public method, with and without the extension."""
+
+    def check(self):
+        decoder = BencodeDecoder()
+        inp = b'l' * 100000 + b'e' * 100000
+        for decode in (decoder.decode_list, decoder.decode_skip):
+            with self.subTest(decode=decode.__name__):
+                with self.assertRaises(DecodeError):
+                    decode(inp)
+        with self.assertRaises(DecodeError):
+            decoder.decode_pick(b'd1:a' + inp + b'e', (b'a',))
+        with self.assertRaises(DecodeError):
+            decoder.decode_pick(b'd1:a' + inp + b'1:bi1ee', (b'b',))
+
+    def test_python(self):
+        with mock.patch.object(Decoder, '_native', None):
+            self.check()
+
+    @unittest.skipIf(Decoder._native is None, 'native extension is not built')
+    def test_native(self):
+        self.check()
+
+
+class DecodePickTest(unittest.TestCase):
+    def setUp(self):
+        self.decoder = BencodeDecoder()
+        self.inp = BencodeEncoder().encode(TORRENT)
+
+    def test_hit(self):
+        self.assertEqual(self.decoder.decode_pick(self.inp, (b'info', 'name')), b'example')
+        self.assertEqual(self.decoder.decode_pick(self.inp, (b'info', b'files')), TORRENT[b'info'][b'files'])
+
+    def test_miss(self):
+        for path in ((b'comment',), (b'info', b'length'), (b'announce', b'x')):
+            with self.subTest(path=path):
+                with self.assertRaises(KeyError):
+                    self.decoder.decode_pick(self.inp, path)
+
+    def test_stops_after_value(self):
+        self.assertEqual(self.decoder.decode_pick(b'd1:ai1e1:bi2ee' + b'garbage', (b'a',)), 1)
+
+
+class DecodeSkipTest(unittest.TestCase):
+    def test_valid(self):
+        self.assertIsNone(BencodeDecoder().decode_skip(BencodeEncoder().encode(TORRENT)))
+
+    def test_trailing_data(self):
+        with self.assertRaises(DecodeError):
+            BencodeDecoder().decode_skip(b'i1ei2e')
+
+
+class BufferInputTest(unittest.TestCase):
+    """Every decode method accepts bytearray and memoryview input like bytes."""
+
+    def setUp(self):
+        self.decoder = BencodeDecoder()
+        self.torrent = BencodeEncoder().encode(TORRENT)
+
+    def assert_buffers(self, method, inp, *args):
+        expected = method(inp, *args)
+        for buffer in (bytearray(inp), memoryview(inp), memoryview(b'xx' + inp)[2:]):
+            with self.subTest(buffer=type(buffer)):
+                self.assertEqual(method(buffer, *args), expected)
+
+    def test_decode_int(self):
+        self.assert_buffers(self.decoder.decode_int, b'i-42e')
+
+    def test_decode_string_bytes(self):
+        self.assert_buffers(self.decoder.decode_string_bytes, b'4:spam')
+
+    def test_decode_list(self):
+        self.assert_buffers(self.decoder.decode_list, b'l4:spami1ee')
+
+    def test_decode_dictionary(self):
+        self.assert_buffers(self.decoder.decode_dictionary, self.torrent)
+
+    def test_decode_skip(self):
+        self.assert_buffers(self.decoder.decode_skip, self.torrent)
+        with self.assertRaises(DecodeError):
+            self.decoder.decode_skip(memoryview(b'i1ei2e'))
+
+    def test_decode_pick(self):
+        self.assert_buffers(self.decoder.decode_pick, self.torrent, (b'info', b'name'))
+
+    @unittest.skipIf(Decoder._native is None, 'native extension is not built')
+    def test_native_does_not_copy(self):
+        inp = memoryview(b'%d:' % 2 ** 20 + b'x' * 2 ** 20)
+        tracemalloc.start()
+        try:
+            self.decoder.decode_skip(inp)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, 2 ** 16)
+
+
+class DecodeErrorTest(unittest.TestCase):
+    def test_lazy_message(self):
+        calls = []
+        error = DecodeError(lambda: calls.append(1) or 'lazy')
+        self.assertEqual(calls, [])
+        self.assertEqual(str(error), 'lazy')
+        self.assertEqual(error.message, 'lazy')
+        self.assertEqual(calls, [1])
+
+    def test_message_is_writable(self):
+        error = DecodeError('inner')
+        error.message = f'outer: {error.message}'
+        self.assertEqual(str(error), 'outer: inner')
+
+
+class EncodeToTest(unittest.TestCase):
+    def test_round_trip(self):
+        encoder = BencodeEncoder()
+        writer = io.BytesIO()
+        encoder.encode_to(TORRENT, writer)
+
+        self.assertEqual(writer.getvalue(), encoder.encode(TORRENT))
+        self.assertEqual(BencodeDecoder().decode_dictionary(writer.getvalue()), TORRENT)
+
+    def test_partial_output_on_error(self):
+        writer = io.BytesIO()
+        with self.assertRaises(EncodeError):
+            BencodeEncoder().encode_to({'a': b'x' * 10, 'b': 1.5}, writer)
+        self.assertEqual(writer.getvalue(), b'd1:a10:xxxxxxxxxx1:b')
+
+
+class EncodeBoolTest(unittest.TestCase):
+    def test_rejected(self):
+        encoder = BencodeEncoder()
+        for obj in (True, False, [1, True], {b'a': False}, {b'a': [{b'b': True}]}):
+            with self.subTest(obj=obj):
+                with self.assertRaises(EncodeError):
+                    encoder.encode(obj)
+
+    def test_encode_int_rejects_bool(self):
+        with self.assertRaises(EncodeError):
+            BencodeEncoder().encode_int(True)
+        self.assertEqual(BencodeEncoder().encode_int(1), b'i1e')
+
+
+class EncodeDictKeysTest(unittest.TestCase):
+    def test_mixed_key_types(self):
+        self.assertEqual(BencodeEncoder().encode({'b': 1, b'a': 2}), b'd1:ai2e1:bi1ee')
+
+    def test_invalid_keys(self):
+        for obj in ({'a': 1, b'a': 2}, {1: 2}, {None: b'x'}):
+            with self.subTest(obj=obj):
+                with self.assertRaises(EncodeError):
+                    BencodeEncoder().encode(obj)
+
+
+if __name__ == '__main__':
+    unittest.main()